@@ -1,7 +1,72 @@
+import hashlib
+import hmac
+import os
+import sys
 import time
-from typing import Dict, List, Optional
-import random
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+from collections import deque
 from dataclasses import dataclass
+from functools import lru_cache
+from operator import attrgetter
+
+import numpy as np
+from numba import njit
+from sortedcontainers import SortedKeyList
+
+ORDER_BOOK_INITIAL_CAPACITY = 64  # Initial slots in the NumPy order arrays; doubled on demand
+USERS_INITIAL_CAPACITY = 16  # Initial slots in the per-user balance arrays; doubled on demand
+POSITIONS_INITIAL_CAPACITY = 16  # Initial slots in each user's NumPy position arrays
+HISTORY_INITIAL_CAPACITY = 16  # Initial slots in each user's history buffers; doubled on demand
+PORTFOLIO_HISTORY_CAPACITY = 4096  # Default ticks of history kept per user before wrapping
+PRICE_BATCH_SIZE = 1024  # Price fluctuations drawn at once when the prefilled stream runs out
+EVENT_BUFFER_SIZE = 10_000  # Most recent order events kept until drain_events() is called
+RISK_REWARD_CACHE_SIZE = 4096  # Most recent risk-reward ratios memoised per SolVault instance
+# scrypt work factors for stored password hashes (CPU/memory cost, block size, parallelism)
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+TRADE_TYPES = frozenset({sys.intern("spot"), sys.intern("perp")})
+
+
+def _risk_reward_ratio(entry_price: float, stop_loss: float, take_profit: float) -> float:
+    """Computes reward over risk for prices that have already been validated."""
+    return abs(take_profit - entry_price) / abs(entry_price - stop_loss)
+
+
+@njit(cache=True)
+def _trailing_stop_level(current_price: float, is_long: bool, entry_price: float,
+                         stop_loss: float, trail_percent: float) -> float:
+    """Returns the stop loss of a filled trailing order after ratcheting it to the current price.
+
+    A NaN stop loss means none is set yet; the stop only ever moves in the trade's favour.
+    """
+    trail_distance = current_price * (trail_percent / 100)
+    if is_long:
+        new_stop_loss = max(entry_price, current_price) - trail_distance
+        if np.isnan(stop_loss) or new_stop_loss > stop_loss:
+            return new_stop_loss
+    else:
+        new_stop_loss = min(entry_price, current_price) + trail_distance
+        if np.isnan(stop_loss) or new_stop_loss < stop_loss:
+            return new_stop_loss
+    return stop_loss
+
+
+# Numba kernels cannot take the order-array dict, so each column is passed in on its own
+@njit(cache=True)
+def _ratchet_trailing_stops(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        current_price: float, is_long: np.ndarray, entry_price: np.ndarray,
+        stop_loss: np.ndarray, trail_percent: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """Ratchets stop_loss in place for the given orders and returns the indices that moved."""
+    moved = np.empty(len(indices), dtype=np.int64)
+    count = 0
+    for i in indices:
+        level = _trailing_stop_level(
+            current_price, is_long[i], entry_price[i], stop_loss[i], trail_percent[i]
+        )
+        if level != stop_loss[i]:
+            stop_loss[i] = level
+            moved[count] = i
+            count += 1
+    return moved[:count]
 
 
 @dataclass
@@ -17,16 +82,69 @@ class Position:
         self.current_value = self.amount * current_price
 
 
+# An order is a flat record of every order parameter; splitting it up would cost an extra
+# indirection on each per-tick attribute load
+class Order:  # pylint: disable=too-many-instance-attributes
+    """Represents an advanced order on SolVault, kept in __slots__ for cheap per-tick access."""
+    __slots__ = (
+        "order_id", "type", "amount", "limit_price", "stop_loss", "trailing_stop",
+        "trail_percent", "take_profit", "oco", "active", "entry_price", "rr_ratio", "user",
+        "is_long", "abs_amount"
+    )
+
+    def __init__(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+            self, order_id: int, trade_type: str, amount: float, limit_price: float,
+            stop_loss: Optional[float], take_profit: Optional[float], trailing_stop: bool,
+            trail_percent: Optional[float], rr_ratio: Optional[float], user: Dict) -> None:
+        self.order_id = order_id  # Position of the order in SolVault.orders
+        self.type = trade_type
+        self.amount = amount
+        self.limit_price = limit_price
+        self.stop_loss = stop_loss
+        self.trailing_stop = trailing_stop
+        self.trail_percent = trail_percent
+        self.take_profit = take_profit
+        self.oco = stop_loss is not None and take_profit is not None
+        self.active = True
+        self.entry_price: Optional[float] = None
+        self.rr_ratio = rr_ratio
+        self.user = user  # Direct reference to the owner's record, avoiding a users lookup per tick
+        self.is_long = amount > 0  # Direction and size are fixed, so resolve them once here
+        self.abs_amount = abs(amount)
+
+    @property
+    def username(self) -> str:
+        """Name of the user who placed the order."""
+        return self.user["username"]
+
+    @property
+    def user_id(self) -> int:
+        """Slot of the owner in SolVault._balances."""
+        return self.user["user_id"]
+
+
 class JupiterAPI:
     """Simulates Jupiter's API for price tracking and trade execution on Solana."""
-    def __init__(self) -> None:
+    def __init__(self, verbose: bool = False, seed: Optional[int] = None) -> None:
+        self.verbose = verbose
         self.current_price = 100.0  # Starting price for the simulated asset
         self.liquidity_pool = 10000.0  # Simulated liquidity pool in USD
+        self._rng = np.random.default_rng(seed)  # Sole source of price fluctuations
+        self._deltas = np.empty(0, dtype=np.float64)  # Pregenerated price fluctuations
+        self._idx = 0  # Next unread entry in self._deltas
+
+    def prefill(self, n: int) -> None:
+        """Pregenerates the next n price fluctuations in bulk for long simulations."""
+        self._deltas = self._rng.uniform(-1.5, 1.5, n)
+        self._idx = 0
 
     def get_price(self) -> float:
         """Simulates fetching the current price from Jupiter's API."""
-        # Simulate price fluctuations
-        self.current_price += random.uniform(-1.5, 1.5)
+        # Simulate price fluctuations, topping up the prefilled stream in batches when it runs out
+        if self._idx == len(self._deltas):
+            self.prefill(PRICE_BATCH_SIZE)
+        self.current_price += float(self._deltas[self._idx])
+        self._idx += 1
         return self.current_price
 
     def execute_trade(self, amount: float, price: float, trade_type: str) -> bool:
@@ -38,281 +156,652 @@ class JupiterAPI:
         if self.liquidity_pool < abs(amount) * price:
             raise ValueError("Insufficient liquidity in the pool.")
         self.liquidity_pool -= abs(amount) * price
-        print(f"Trade executed: {amount} {trade_type} at {price}")
+        if self.verbose:
+            print(f"Trade executed: {amount} {trade_type} at {price}")
         return True
 
 
 class SolVault:
     """SolVault trading platform, leveraging Jupiter's API on Solana."""
-    def __init__(self) -> None:
+    def __init__(self, verbose: bool = False, seed: Optional[int] = None,
+                 history_capacity: int = PORTFOLIO_HISTORY_CAPACITY) -> None:
+        self.verbose = verbose  # Print account and order activity in addition to buffering events
+        self.history_capacity = history_capacity  # Snapshots kept per user before the oldest drop
         self.users: Dict[str, Dict] = {}
-        self.jupiter = JupiterAPI()
-        self.orders: List[Dict] = []
+        # Numeric per-user fields as plain arrays indexed by user_id; the first len(self.users)
+        # slots are live
+        self._balances = np.zeros(USERS_INITIAL_CAPACITY, dtype=np.float64)
+        self._positions_value = np.zeros(USERS_INITIAL_CAPACITY, dtype=np.float64)
+        self.jupiter = JupiterAPI(verbose, seed)  # A fixed seed makes the price path reproducible
+        # Risk-reward ratios memoised on the exact price triple, so a hit is always exact
+        self._risk_reward = lru_cache(maxsize=RISK_REWARD_CACHE_SIZE)(_risk_reward_ratio)
+        # (event_type, order_id, price) tuples from the order loop, oldest first
+        self._events: Deque[Tuple[str, int, float]] = deque(maxlen=EVENT_BUFFER_SIZE)
+        self._last_tick_ns = 0  # time.monotonic_ns() taken at the start of the latest tick
+        # Exit trigger envelope over filled, active orders; it may stay wider than needed until
+        # the next exit scan recomputes it
+        self._stop_ceiling = -np.inf  # Highest stop loss
+        self._profit_floor = np.inf  # Lowest take profit
+        self._trailing_armed = False  # Whether any trailing stop needs ratcheting
+        # Ids of filled orders waiting on an exit; exited ids are pruned on the next exit scan
+        self._armed: List[int] = []
+        self.orders: List[Order] = []
+        # Structure-of-arrays mirror of self.orders, indexed by order position
+        self._orders_np: Dict[str, np.ndarray] = self._allocate_order_arrays(
+            ORDER_BOOK_INITIAL_CAPACITY
+        )
+        # Unfilled orders by trigger proximity: longs fill at or above their limit, shorts at or
+        # below it
+        self.buy_limits = SortedKeyList(key=attrgetter("limit_price"))
+        self.sell_limits = SortedKeyList(key=lambda order: -order.limit_price)
 
     def register(self, username: str, password: str, initial_balance: float = 1000.0) -> None:
         """Registers a new user on SolVault."""
-        self._validate_username(username)
-        self._validate_password(password)
-        self._validate_balance(initial_balance)
+        if __debug__:
+            self._validate_credentials(username, password)
+            if not isinstance(initial_balance, (int, float)) or initial_balance < 0:
+                raise ValueError("Initial balance must be a non-negative number.")
+        username = sys.intern(username)
 
         if username in self.users:
             raise ValueError("Username already exists.")
 
+        user_id = len(self.users)
+        if user_id == len(self._balances):
+            self._balances = np.concatenate((self._balances, np.zeros(user_id)))
+            self._positions_value = np.concatenate((self._positions_value, np.zeros(user_id)))
+        self._balances[user_id] = initial_balance
+        self._positions_value[user_id] = 0.0
+
+        history_size = min(HISTORY_INITIAL_CAPACITY, self.history_capacity)
+        salt = os.urandom(16)
         self.users[username] = {
-            "password": password,  # Note: In production, use hashing (e.g., bcrypt)
-            "balance": initial_balance,
-            "positions": [],  # List of Position objects
+            "username": username,
+            "user_id": user_id,  # Slot of the user in self._balances and self._positions_value
+            "salt": salt,
+            "password_hash": self._hash_password(password, salt),  # 32-byte scrypt digest
+            # Open positions as parallel arrays; only the first pos_count slots are live
+            "pos_type": [],
+            "pos_amount": np.empty(POSITIONS_INITIAL_CAPACITY, dtype=np.float64),
+            "pos_entry": np.empty(POSITIONS_INITIAL_CAPACITY, dtype=np.float64),
+            "pos_value": np.empty(POSITIONS_INITIAL_CAPACITY, dtype=np.float64),
+            "pos_count": 0,
             "orders": [],
-            "portfolio_history": []  # Track balance and positions over time
+            "active_orders": set(),  # Orders still waiting to fill or exit
+            # Ring buffer tracking balance and positions over time, grown up to history_capacity
+            "hist_time": np.empty(history_size, dtype=np.int64),  # monotonic ns
+            "hist_bal": np.empty(history_size, dtype=np.float64),
+            "hist_posval": np.empty(history_size, dtype=np.float64),
+            "hist_head": 0,  # Next slot to write
+            "hist_count": 0  # Number of snapshots recorded so far
         }
-        print(f"Registered {username} with balance {initial_balance} on SolVault")
+        if self.verbose:
+            print(f"Registered {username} with balance {initial_balance} on SolVault")
 
     def login(self, username: str, password: str) -> bool:
         """Logs in a user to SolVault."""
-        self._validate_username(username)
-        self._validate_password(password)
-
-        if username not in self.users or self.users[username]["password"] != password:
+        if __debug__:
+            self._validate_credentials(username, password)
+        username = sys.intern(username)
+
+        user = self.users.get(username)
+        if user is None or not hmac.compare_digest(
+            user["password_hash"], self._hash_password(password, user["salt"])
+        ):
             raise ValueError("Invalid credentials.")
 
-        print(f"Logged in as {username} on SolVault")
+        if self.verbose:
+            print(f"Logged in as {username} on SolVault")
         return True
 
-    def calculate_risk_reward(self, entry_price: float, stop_loss: float, take_profit: float) -> float:
+    def calculate_risk_reward(self, entry_price: float, stop_loss: float,
+                              take_profit: float) -> float:
         """Calculates the risk-reward ratio for a trade."""
-        self._validate_prices(entry_price, stop_loss, take_profit)
+        if __debug__:
+            self._validate_prices(entry_price, stop_loss, take_profit)
 
-        risk = abs(entry_price - stop_loss)
-        reward = abs(take_profit - entry_price)
-        if risk == 0:
+        if entry_price == stop_loss:
             raise ValueError("Risk cannot be zero.")
-        return reward / risk
+        return self._risk_reward(entry_price, stop_loss, take_profit)
 
     def place_order(self, username: str, trade_type: str, amount: float, limit_price: float,
                 stop_loss: Optional[float] = None, take_profit: Optional[float] = None,
                 trailing_stop: bool = False, trailing_percent: float = 1.0) -> bool:
         """Places an advanced order on SolVault."""
-        self._validate_username(username)
-        self._validate_trade_type(trade_type)
-        self._validate_amount(amount)
-        self._validate_limit_price(limit_price)
-        self._validate_stop_loss(stop_loss)
-        self._validate_take_profit(take_profit)
-        self._validate_trailing_stop(trailing_stop, trailing_percent)
+        if __debug__:
+            self._validate_order(username, trade_type, amount, limit_price)
+            self._validate_exit_levels(stop_loss, take_profit, trailing_stop, trailing_percent)
+        # Intern repeated strings so orders share one object and comparisons hit the identity check
+        username = sys.intern(username)
+        trade_type = sys.intern(trade_type)
 
         user = self.users[username]
         current_price = self.jupiter.get_price()
 
-        if user["balance"] < abs(amount) * current_price:
+        if self._balances[user["user_id"]] < abs(amount) * current_price:
             raise ValueError("Insufficient balance for the order.")
 
         rr_ratio = None
         if stop_loss and take_profit:
             rr_ratio = self.calculate_risk_reward(current_price, stop_loss, take_profit)
 
-        order = {
-            "username": username,
-            "type": trade_type,
-            "amount": amount,
-            "limit_price": limit_price,
-            "stop_loss": stop_loss,
-            "trailing_stop": trailing_stop,
-            "trail_percent": trailing_percent if trailing_stop else None,
-            "take_profit": take_profit,
-            "oco": stop_loss is not None and take_profit is not None,
-            "active": True,
-            "entry_price": None,
-            "rr_ratio": rr_ratio
-        }
+        order = Order(
+            order_id=len(self.orders),
+            trade_type=trade_type,
+            amount=amount,
+            limit_price=limit_price,
+            stop_loss=stop_loss,
+            take_profit=take_profit,
+            trailing_stop=trailing_stop,
+            trail_percent=trailing_percent if trailing_stop else None,
+            rr_ratio=rr_ratio,
+            user=user
+        )
+        self._append_order_arrays(order)
         self.orders.append(order)
         user["orders"].append(order)
-        print(
-            f"Placed {trade_type} order on SolVault: Amount={amount}, "
-            f"Limit={limit_price}, SL={stop_loss}, TP={take_profit}, "
-            f"Trailing={trailing_stop} ({trailing_percent}%)"
-        )
+        user["active_orders"].add(order)
+        (self.buy_limits if order.is_long else self.sell_limits).add(order)
+        if self.verbose:
+            print(
+                f"Placed {trade_type} order on SolVault: Amount={amount}, "
+                f"Limit={limit_price}, SL={stop_loss}, TP={take_profit}, "
+                f"Trailing={trailing_stop} ({trailing_percent}%)"
+            )
         return True
 
     def close_position(self, username: str, position_index: int) -> bool:
         """Closes a position for a user."""
-        self._validate_username(username)
+        if __debug__:
+            self._validate_username(username)
         user = self.users[username]
 
-        if not 0 <= position_index < len(user["positions"]):
+        count = user["pos_count"]
+        if not 0 <= position_index < count:
             raise ValueError("Invalid position index.")
 
-        position = user["positions"][position_index]
+        amounts, entries, values = user["pos_amount"], user["pos_entry"], user["pos_value"]
+        user_id = user["user_id"]
+        self._positions_value[user_id] -= values[position_index]
         current_price = self.jupiter.get_price()
-        position.update_value(current_price)
-        profit_loss = position.current_value - (position.amount * position.entry_price)
-        user["balance"] += position.current_value
-        del user["positions"][position_index]
-        print(f"Closed position for {username}: Profit/Loss = {profit_loss:.2f}")
+        current_value = float(amounts[position_index] * current_price)
+        profit_loss = current_value - amounts[position_index] * entries[position_index]
+        self._balances[user_id] += current_value
+
+        # Shift the remaining positions down to keep the live slots contiguous
+        for column in (amounts, entries, values):
+            column[position_index:count - 1] = column[position_index + 1:count]
+        del user["pos_type"][position_index]
+        user["pos_count"] = count - 1
+        if self.verbose:
+            print(f"Closed position for {username}: Profit/Loss = {profit_loss:.2f}")
         return True
 
-    def update_positions(self) -> None:
-        """Updates the current value of all open positions based on the latest market price."""
-        current_price = self.jupiter.get_price()
+    def update_positions(self, current_price: float) -> None:
+        """Updates the current value of all open positions at the given market price."""
+        positions_value = self._positions_value
         for user in self.users.values():
-            for position in user["positions"]:
-                position.update_value(current_price)
+            count = user["pos_count"]
+            values = user["pos_value"][:count]
+            np.multiply(user["pos_amount"][:count], current_price, out=values)
+            positions_value[user["user_id"]] = values.sum()
 
-    def update_trailing_stop(self, order: Dict, current_price: float) -> None:
+    def update_trailing_stop(self, order: Order, current_price: float) -> None:
         """Updates a trailing stop order based on the current price."""
-        if not order["trailing_stop"] or not order["active"] or not order["entry_price"]:
+        if not order.trailing_stop or not order.active or not order.entry_price:
             return
 
-        trail_distance = current_price * (order["trail_percent"] / 100)
-        if order["amount"] > 0:  # Long position
-            max_price = max(order["entry_price"], current_price)
-            new_stop_loss = max_price - trail_distance
-            if new_stop_loss > order["stop_loss"] or order["stop_loss"] is None:
-                order["stop_loss"] = new_stop_loss
-                print(f"Trailing stop updated to {order['stop_loss']:.2f} (long)")
-        else:  # Short position
-            min_price = min(order["entry_price"], current_price)
-            new_stop_loss = min_price + trail_distance
-            if new_stop_loss < order["stop_loss"] or order["stop_loss"] is None:
-                order["stop_loss"] = new_stop_loss
-                print(f"Trailing stop updated to {order['stop_loss']:.2f} (short)")
+        stop_loss = np.nan if order.stop_loss is None else order.stop_loss
+        new_stop_loss = _trailing_stop_level(
+            current_price, order.is_long, order.entry_price, stop_loss, order.trail_percent
+        )
+        if new_stop_loss != stop_loss:
+            self._move_trailing_stop(order, new_stop_loss)
+            self._sync_order_arrays(order.order_id, order)
+
+    def _move_trailing_stop(self, order: Order, new_stop_loss: float) -> None:
+        """Records a ratcheted trailing stop on the order."""
+        order.stop_loss = new_stop_loss
+        self._events.append(("trailing_stop", order.order_id, new_stop_loss))
+        if self.verbose:
+            side = "long" if order.is_long else "short"
+            print(f"Trailing stop updated to {order.stop_loss:.2f} ({side})")
 
     def check_market_and_execute(self) -> None:
         """Checks market conditions and executes orders."""
+        self._last_tick_ns = tick_ns = time.monotonic_ns()
         current_price = self.jupiter.get_price()
-        self.update_positions()
-        print(f"Current price: {current_price:.2f} | Liquidity: {self.jupiter.liquidity_pool:.2f}")
-
-        for order in self.orders:
-            if not order["active"]:
-                continue
-
-            user = self.users[order["username"]]
-            target_hit = (order["amount"] > 0 and current_price >= order["limit_price"]) or \
-                        (order["amount"] < 0 and current_price <= order["limit_price"])
-            stop_hit = order["stop_loss"] and current_price <= order["stop_loss"]
-            profit_hit = order["take_profit"] and current_price >= order["take_profit"]
-
-            if target_hit:
-                try:
-                    if self.jupiter.execute_trade(order["amount"], current_price, order["type"]):
-                        order["entry_price"] = current_price
-                        user["positions"].append(Position(
-                            type=order["type"],
-                            amount=order["amount"],
-                            entry_price=current_price,
-                            current_value=order["amount"] * current_price
-                        ))
-                        user["balance"] -= abs(order["amount"] * current_price)
-                        print(f"Executed {order['type']} order for {order['username']} at {current_price}")
-                        if not (order["stop_loss"] or order["take_profit"]):
-                            order["active"] = False
-                except ValueError as e:
-                    print(f"Order execution failed: {e}")
-                    order["active"] = False
-
-            if order["entry_price"] and order["trailing_stop"]:
-                self.update_trailing_stop(order, current_price)
-
-            if order["entry_price"] and (stop_hit or profit_hit):
-                if order["oco"]:
-                    action = "stop loss" if stop_hit else "take profit"
-                    user["balance"] += abs(order["amount"] * current_price)
-                    order["active"] = False
-                    print(f"OCO triggered {action} for {order['username']} at {current_price}")
-                elif stop_hit:
-                    user["balance"] += abs(order["amount"] * current_price)
-                    order["active"] = False
-                    print(f"Stop loss triggered for {order['username']} at {current_price}")
-                elif profit_hit:
-                    user["balance"] += abs(order["amount"] * current_price)
-                    order["active"] = False
-                    print(f"Take profit triggered for {order['username']} at {current_price}")
-
-            user["portfolio_history"].append({
-                "time": time.time(),
-                "balance": user["balance"],
-                "positions_value": sum(p.current_value for p in user["positions"])
-            })
+        self.update_positions(current_price)
+        if self.verbose:
+            print(
+                f"Current price: {current_price:.2f} | "
+                f"Liquidity: {self.jupiter.liquidity_pool:.2f}"
+            )
+
+        # Fill pending entries from the top of each side of the book until the price stops crossing
+        while self.buy_limits and self.buy_limits[0].limit_price <= current_price:
+            self._fill_order(self.buy_limits.pop(0), current_price)
+        while self.sell_limits and self.sell_limits[0].limit_price >= current_price:
+            self._fill_order(self.sell_limits.pop(0), current_price)
+
+        # Exits can only fire once the price leaves the band between the highest stop loss and the
+        # lowest take profit of filled orders; trailing stops move every tick, so they always scan
+        if self._trailing_armed or not self._stop_ceiling < current_price < self._profit_floor:
+            self._check_exits(current_price)
+
+        balances, positions_value = self._balances, self._positions_value
+        history_capacity = self.history_capacity
+        for user in self.users.values():
+            user_id = user["user_id"]
+            head = user["hist_head"]
+            if head == len(user["hist_time"]):
+                self._grow_history(user)
+            user["hist_time"][head] = tick_ns
+            user["hist_bal"][head] = balances[user_id]
+            user["hist_posval"][head] = positions_value[user_id]
+            user["hist_head"] = (head + 1) % history_capacity
+            user["hist_count"] += 1
+
+    def _grow_history(self, user: Dict) -> None:
+        """Doubles a user's history buffers, never past history_capacity."""
+        size = len(user["hist_time"])
+        for key in ("hist_time", "hist_bal", "hist_posval"):
+            grown = np.empty(min(2 * size, self.history_capacity), dtype=user[key].dtype)
+            grown[:size] = user[key]
+            user[key] = grown
+
+    def portfolio_history(self, username: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns a user's (monotonic ns, balance, positions value) snapshots, oldest first."""
+        if __debug__:
+            self._validate_username(username)
+
+        if username not in self.users:
+            raise ValueError("User not found.")
+
+        user = self.users[username]
+        size = len(user["hist_time"])
+        count = min(user["hist_count"], size)
+        # Once the buffers wrap, the oldest snapshot sits at the write head
+        order = (user["hist_head"] - count + np.arange(count)) % size
+        return user["hist_time"][order], user["hist_bal"][order], user["hist_posval"][order]
+
+    def run(self, n_ticks: int, dt: float = 0.0,
+            on_tick: Optional[Callable[[], None]] = None) -> None:
+        """Runs n_ticks market checks back to back, optionally pausing dt seconds after each."""
+        self.jupiter.prefill(n_ticks)
+        for _ in range(n_ticks):
+            self.check_market_and_execute()
+            if on_tick is not None:
+                on_tick()
+            if dt > 0:
+                time.sleep(dt)
+
+    def _check_exits(self, current_price: float) -> None:
+        """Evaluates exits as vector masks, then visits only the orders whose exits fired."""
+        book = self._orders_np
+        armed = np.array(self._armed, dtype=np.intp)
+        stop = current_price <= book["sl"][armed]
+        profit = current_price >= book["tp"][armed]
+
+        # Trailing stops move after the exit masks are taken, so a new stop applies from next tick
+        moved = _ratchet_trailing_stops(
+            current_price, book["long"], book["entry"], book["sl"], book["trail"],
+            armed[book["trailing"][armed]]
+        )
+        for index in moved:
+            self._move_trailing_stop(self.orders[index], float(book["sl"][index]))
+
+        hit = stop | profit
+        self._apply_exits(armed[hit], stop[hit], profit[hit], current_price)
+
+        # Drop exited orders and narrow the envelope back down to the ones still armed
+        armed = armed[book["active"][armed]]
+        self._armed = armed.tolist()
+        self._recompute_trigger_envelope(armed)
+
+    def _recompute_trigger_envelope(self, armed: np.ndarray) -> None:
+        """Rebuilds the exit trigger envelope from the ids of the filled, active orders."""
+        book = self._orders_np
+        stop_losses = book["sl"][armed]
+        take_profits = book["tp"][armed]
+        self._stop_ceiling = float(
+            np.max(stop_losses, initial=-np.inf, where=~np.isnan(stop_losses))
+        )
+        self._profit_floor = float(
+            np.min(take_profits, initial=np.inf, where=~np.isnan(take_profits))
+        )
+        self._trailing_armed = bool(np.any(book["trailing"][armed]))
+
+    def _apply_exits(self, indices: np.ndarray, stop: np.ndarray, profit: np.ndarray,
+                     current_price: float) -> None:
+        """Closes out triggered orders at the current price, in the order they filled.
+
+        stop and profit hold the hit flags for the matching entries of indices.
+        """
+        balances = self._balances
+        for index, stop_hit, profit_hit in zip(indices, stop, profit):
+            order = self.orders[index]
+            notional = order.abs_amount * current_price
+
+            if order.oco:
+                action = "stop loss" if stop_hit else "take profit"
+                balances[order.user_id] += notional
+                self._deactivate_order(order)
+                event_type = "stop_loss" if stop_hit else "take_profit"
+                self._events.append((event_type, order.order_id, current_price))
+                if self.verbose:
+                    print(f"OCO triggered {action} for {order.username} at {current_price}")
+            elif stop_hit:
+                balances[order.user_id] += notional
+                self._deactivate_order(order)
+                self._events.append(("stop_loss", order.order_id, current_price))
+                if self.verbose:
+                    print(f"Stop loss triggered for {order.username} at {current_price}")
+            elif profit_hit:
+                balances[order.user_id] += notional
+                self._deactivate_order(order)
+                self._events.append(("take_profit", order.order_id, current_price))
+                if self.verbose:
+                    print(f"Take profit triggered for {order.username} at {current_price}")
+
+            self._sync_order_arrays(index, order)
+
+    def _fill_order(self, order: Order, current_price: float) -> None:
+        """Executes a pending order taken off the book and opens its position."""
+        try:
+            if self.jupiter.execute_trade(order.amount, current_price, order.type):
+                order.entry_price = current_price
+                self._open_position(order.user, order.type, order.amount, current_price)
+                self._balances[order.user_id] -= order.abs_amount * current_price
+                self._events.append(("fill", order.order_id, current_price))
+                if self.verbose:
+                    print(f"Executed {order.type} order for {order.username} at {current_price}")
+                if not (order.stop_loss or order.take_profit or order.trailing_stop):
+                    self._deactivate_order(order)
+                else:
+                    self._armed.append(order.order_id)
+                    self._widen_trigger_envelope(order)
+        except ValueError as e:
+            self._deactivate_order(order)
+            self._events.append(("fill_failed", order.order_id, current_price))
+            if self.verbose:
+                print(f"Order execution failed: {e}")
+        self._sync_order_arrays(order.order_id, order)
+
+    def _open_position(self, user: Dict, trade_type: str, amount: float,
+                       entry_price: float) -> None:
+        """Appends a position to the user's position arrays, doubling their capacity when full."""
+        count = user["pos_count"]
+        if count == len(user["pos_amount"]):
+            for key in ("pos_amount", "pos_entry", "pos_value"):
+                grown = np.empty(2 * count, dtype=np.float64)
+                grown[:count] = user[key]
+                user[key] = grown
+
+        user["pos_type"].append(trade_type)
+        user["pos_amount"][count] = amount
+        user["pos_entry"][count] = entry_price
+        user["pos_value"][count] = amount * entry_price
+        user["pos_count"] = count + 1
+        self._positions_value[user["user_id"]] += amount * entry_price
+
+    @staticmethod
+    def _positions(user: Dict) -> List[Position]:
+        """Builds Position records from the user's position arrays for display."""
+        return [
+            Position(
+                type=user["pos_type"][i],
+                amount=float(user["pos_amount"][i]),
+                entry_price=float(user["pos_entry"][i]),
+                current_value=float(user["pos_value"][i])
+            )
+            for i in range(user["pos_count"])
+        ]
+
+    @staticmethod
+    def _deactivate_order(order: Order) -> None:
+        """Marks an order inactive and drops it from its owner's active set."""
+        order.active = False
+        order.user["active_orders"].discard(order)
+
+    def _widen_trigger_envelope(self, order: Order) -> None:
+        """Extends the exit trigger envelope to cover a newly filled order."""
+        if order.stop_loss is not None:
+            self._stop_ceiling = max(self._stop_ceiling, order.stop_loss)
+        if order.take_profit is not None:
+            self._profit_floor = min(self._profit_floor, order.take_profit)
+        self._trailing_armed = self._trailing_armed or order.trailing_stop
+
+    def drain_events(self) -> List[Tuple[str, int, float]]:
+        """Returns and clears the buffered order events, oldest first."""
+        events = list(self._events)
+        self._events.clear()
+        return events
 
     def dashboard(self, username: str) -> None:
         """Displays the SolVault dashboard for a user."""
-        self._validate_username(username)
+        if __debug__:
+            self._validate_username(username)
 
         if username not in self.users:
             raise ValueError("User not found.")
 
         user = self.users[username]
-        total_value = user["balance"] + sum(p.current_value for p in user["positions"])
+        balance = self._balances[user["user_id"]]
+        total_value = balance + self._positions_value[user["user_id"]]
         print(f"\n=== SolVault Dashboard for {username} ===")
-        print(f"Balance: {user['balance']:.2f}")
-        print(f"Positions: {user['positions']}")
-        print(f"Active Orders: {len(user['orders'])}")
+        print(f"Balance: {balance:.2f}")
+        print(f"Positions: {self._positions(user)}")
+        print(f"Active Orders: {len(user['active_orders'])}")
         print(f"Portfolio Value: {total_value:.2f}")
-        if user["portfolio_history"]:
+        if user["hist_count"]:
+            latest = (user["hist_head"] - 1) % len(user["hist_time"])
             print(
-                f"Latest Portfolio Update: Balance={user['portfolio_history'][-1]['balance']:.2f}, "
-                f"Positions Value={user['portfolio_history'][-1]['positions_value']:.2f}"
+                f"Latest Portfolio Update: Balance={user['hist_bal'][latest]:.2f}, "
+                f"Positions Value={user['hist_posval'][latest]:.2f}"
             )
         print("====================\n")
 
-    def _validate_username(self, username: str) -> None:
+    @staticmethod
+    def _allocate_order_arrays(capacity: int) -> Dict[str, np.ndarray]:
+        """Allocates empty NumPy order arrays with room for the given number of orders."""
+        return {
+            "sl": np.full(capacity, np.nan),
+            "tp": np.full(capacity, np.nan),
+            "long": np.zeros(capacity, dtype=bool),
+            "trailing": np.zeros(capacity, dtype=bool),
+            "trail": np.full(capacity, np.nan),
+            "active": np.zeros(capacity, dtype=bool),
+            "user": np.zeros(capacity, dtype=np.intp),
+            "entry": np.full(capacity, np.nan),
+        }
+
+    def _append_order_arrays(self, order: Order) -> None:
+        """Mirrors a new order into the NumPy order arrays, doubling their capacity when full."""
+        index = len(self.orders)
+        book = self._orders_np
+        if index == len(book["active"]):
+            grown = self._allocate_order_arrays(2 * index)
+            for key, values in book.items():
+                grown[key][:index] = values
+            self._orders_np = book = grown
+
+        book["tp"][index] = np.nan if order.take_profit is None else order.take_profit
+        book["user"][index] = order.user_id
+        book["long"][index] = order.is_long
+        book["trailing"][index] = order.trailing_stop
+        book["trail"][index] = np.nan if order.trail_percent is None else order.trail_percent
+        self._sync_order_arrays(index, order)
+
+    def _sync_order_arrays(self, index: int, order: Order) -> None:
+        """Copies the mutable fields of an order back into the NumPy order arrays."""
+        book = self._orders_np
+        book["active"][index] = order.active
+        book["sl"][index] = np.nan if order.stop_loss is None else order.stop_loss
+        book["entry"][index] = np.nan if order.entry_price is None else order.entry_price
+
+    @staticmethod
+    def _hash_password(password: str, salt: bytes) -> bytes:
+        """Derives a slow, salted scrypt digest so only the digest is ever stored."""
+        return hashlib.scrypt(
+            password.encode(), salt=salt, n=SCRYPT_N, r=SCRYPT_R, p=SCRYPT_P, dklen=32
+        )
+
+    # Like asserts, these input checks are compiled out when Python runs with -O
+    @staticmethod
+    def _validate_username(username: str) -> None:
         """Validates the username."""
         if not isinstance(username, str) or not username.strip():
             raise ValueError("Username must be a non-empty string.")
 
-    def _validate_password(self, password: str) -> None:
-        """Validates the password."""
+    def _validate_credentials(self, username: str, password: str) -> None:
+        """Validates a username and password pair."""
+        self._validate_username(username)
         if not isinstance(password, str) or not password.strip():
             raise ValueError("Password must be a non-empty string.")
 
-    def _validate_balance(self, balance: float) -> None:
-        """Validates the initial balance."""
-        if not isinstance(balance, (int, float)) or balance < 0:
-            raise ValueError("Initial balance must be a non-negative number.")
-
-    def _validate_trade_type(self, trade_type: str) -> None:
-        """Validates the trade type."""
-        if trade_type not in ["spot", "perp"]:
+    def _validate_order(self, username: str, trade_type: str, amount: float,
+                        limit_price: float) -> None:
+        """Validates the owner, type, size and limit price of an order."""
+        self._validate_username(username)
+        if trade_type not in TRADE_TYPES:
             raise ValueError("Trade type must be 'spot' or 'perp'.")
-
-    def _validate_amount(self, amount: float) -> None:
-        """Validates the trade amount."""
         if not isinstance(amount, (int, float)) or amount == 0:
             raise ValueError("Amount must be a non-zero number.")
-
-    def _validate_limit_price(self, limit_price: float) -> None:
-        """Validates the limit price."""
-        if not isinstance(limit_price, (int, float)) or limit_price <= 0:
+        if not isinstance(limit_price, (int, float)) or not limit_price > 0:
             raise ValueError("Limit price must be a positive number.")
 
-    def _validate_stop_loss(self, stop_loss: Optional[float]) -> None:
-        """Validates the stop loss."""
-        if stop_loss is not None and (not isinstance(stop_loss, (int, float)) or stop_loss <= 0):
+    @staticmethod
+    def _validate_exit_levels(stop_loss: Optional[float], take_profit: Optional[float],
+                              trailing_stop: bool, trailing_percent: float) -> None:
+        """Validates the stop loss, take profit and trailing stop parameters of an order."""
+        if stop_loss is not None and (not isinstance(stop_loss, (int, float)) or not stop_loss > 0):
             raise ValueError("Stop loss, if provided, must be a positive number.")
-
-    def _validate_take_profit(self, take_profit: Optional[float]) -> None:
-        """Validates the take profit."""
-        if take_profit is not None and (not isinstance(take_profit, (int, float)) or take_profit <= 0):
+        if take_profit is not None and (
+            not isinstance(take_profit, (int, float)) or not take_profit > 0
+        ):
             raise ValueError("Take profit, if provided, must be a positive number.")
-
-    def _validate_trailing_stop(self, trailing_stop: bool, trailing_percent: float) -> None:
-        """Validates the trailing stop parameters."""
         if not isinstance(trailing_stop, bool):
             raise ValueError("Trailing stop must be a boolean.")
-        if not isinstance(trailing_percent, (int, float)) or trailing_percent <= 0:
+        if not isinstance(trailing_percent, (int, float)) or not trailing_percent > 0:
             raise ValueError("Trailing percent must be a positive number.")
 
-    def _validate_prices(self, entry_price: float, stop_loss: float, take_profit: float) -> None:
+    @staticmethod
+    def _validate_prices(entry_price: float, stop_loss: float, take_profit: float) -> None:
         """Validates the prices for risk-reward calculation."""
-        if not all(isinstance(x, (int, float)) for x in [entry_price, stop_loss, take_profit]):
+        if not (isinstance(entry_price, (int, float)) and isinstance(stop_loss, (int, float))
+                and isinstance(take_profit, (int, float))):
             raise ValueError("Prices must be numbers.")
-        if entry_price <= 0 or stop_loss <= 0 or take_profit <= 0:
+        if not (entry_price > 0 and stop_loss > 0 and take_profit > 0):
             raise ValueError("Prices must be positive.")
 
 
+# Doctests for the order loop, run with: python -m doctest -v solvault.py
+__test__ = {
+    "limit_fill_order": """
+    Longs fill lowest limit first once the price rises through them, shorts highest limit first
+    once it falls through them.
+
+    >>> vault = SolVault()
+    >>> vault.register("alice", "pw", 10_000.0)
+    >>> prices = iter([100.0] * 6 + [102.5, 98.5, 97.0])
+    >>> vault.jupiter.get_price = lambda: next(prices)
+    >>> for limit in (103.0, 101.0, 102.0):
+    ...     _ = vault.place_order("alice", "spot", 1.0, limit)
+    >>> for limit in (97.0, 99.0, 98.0):
+    ...     _ = vault.place_order("alice", "spot", -1.0, limit)
+    >>> vault.check_market_and_execute()
+    >>> vault.drain_events()
+    [('fill', 1, 102.5), ('fill', 2, 102.5)]
+    >>> vault.check_market_and_execute()
+    >>> vault.drain_events()
+    [('fill', 4, 98.5)]
+    >>> vault.check_market_and_execute()
+    >>> vault.drain_events()
+    [('fill', 5, 97.0), ('fill', 3, 97.0)]
+    >>> [order.limit_price for order in vault.buy_limits], list(vault.sell_limits)
+    ([103.0], [])
+    """,
+    "bracket_order_fills_once": """
+    An order that stays active for its stop loss and take profit is only bought once.
+
+    >>> vault = SolVault()
+    >>> vault.register("alice", "pw", 10_000.0)
+    >>> prices = iter([100.0, 100.5, 101.0, 102.0])
+    >>> vault.jupiter.get_price = lambda: next(prices)
+    >>> vault.place_order("alice", "spot", 1.0, 100.0, stop_loss=95.0, take_profit=110.0)
+    True
+    >>> for _ in range(3):
+    ...     vault.check_market_and_execute()
+    >>> vault.drain_events()
+    [('fill', 0, 100.5)]
+    >>> vault.users["alice"]["pos_count"], float(vault._balances[0])
+    (1, 9899.5)
+    """,
+    "no_exit_scan_inside_envelope": """
+    While the price stays between the highest stop loss and the lowest take profit, the exit
+    scan is skipped entirely.
+
+    >>> vault = SolVault()
+    >>> vault.register("alice", "pw", 10_000.0)
+    >>> prices = iter([100.0, 100.0, 100.0, 96.0, 104.0, 109.9])
+    >>> vault.jupiter.get_price = lambda: next(prices)
+    >>> vault.place_order("alice", "spot", 1.0, 100.0, stop_loss=95.0, take_profit=110.0)
+    True
+    >>> vault.check_market_and_execute()
+    >>> scans = []
+    >>> vault._check_exits = scans.append
+    >>> for _ in range(4):
+    ...     vault.check_market_and_execute()
+    >>> scans, vault.drain_events()
+    ([], [('fill', 0, 100.0)])
+    """,
+    "envelope_narrows_after_exit": """
+    An exit drops the order from the envelope, which narrows to the orders still armed.
+
+    >>> vault = SolVault()
+    >>> vault.register("alice", "pw", 10_000.0)
+    >>> prices = iter([100.0, 100.0, 100.0, 106.0])
+    >>> vault.jupiter.get_price = lambda: next(prices)
+    >>> vault.place_order("alice", "spot", 1.0, 100.0, stop_loss=95.0, take_profit=105.0)
+    True
+    >>> vault.place_order("alice", "spot", 1.0, 100.0, stop_loss=90.0, take_profit=120.0)
+    True
+    >>> vault.check_market_and_execute()
+    >>> vault._stop_ceiling, vault._profit_floor
+    (95.0, 105.0)
+    >>> vault.check_market_and_execute()
+    >>> vault.drain_events()[-1]
+    ('take_profit', 0, 106.0)
+    >>> vault._stop_ceiling, vault._profit_floor, vault._armed
+    (90.0, 120.0, [1])
+    """,
+    "trailing_only_order": """
+    A trailing stop without a stop loss starts from NaN, ratchets up with the price and then
+    stops the order out.
+
+    >>> vault = SolVault()
+    >>> vault.register("alice", "pw", 10_000.0)
+    >>> prices = iter([100.0, 100.0, 105.0, 103.0, 102.0])
+    >>> vault.jupiter.get_price = lambda: next(prices)
+    >>> vault.place_order("alice", "spot", 1.0, 100.0, trailing_stop=True, trailing_percent=2.0)
+    True
+    >>> for _ in range(4):
+    ...     vault.check_market_and_execute()
+    >>> events = vault.drain_events()
+    >>> [kind for kind, _, _ in events]
+    ['fill', 'trailing_stop', 'trailing_stop', 'stop_loss']
+    >>> [round(price, 2) for _, _, price in events]
+    [100.0, 98.0, 102.9, 102.0]
+    >>> vault.orders[0].active, vault._armed
+    (False, [])
+    """,
+}
+
+
 if __name__ == "__main__":
     try:
-        sol_vault = SolVault()
+        sol_vault = SolVault(verbose=True)
         sol_vault.register("protrader", "pass456", 5000.0)
         sol_vault.login("protrader", "pass456")
 
@@ -324,10 +813,8 @@ if __name__ == "__main__":
         sol_vault.place_order("protrader", "perp", -5.0, 98.0, stop_loss=102.0,
                             take_profit=95.0, trailing_stop=True, trailing_percent=2.0)
 
-        for _ in range(15):
-            sol_vault.check_market_and_execute()
-            sol_vault.dashboard("protrader")
-            time.sleep(1)
+        # Tick once per second so the demo can be followed; simulations should use dt=0
+        sol_vault.run(15, dt=1.0, on_tick=lambda: sol_vault.dashboard("protrader"))
 
         # Close a position (e.g., first position)
         sol_vault.close_position("protrader", 0)